@@ -1,20 +1,38 @@
 import os
+import asyncio
 import re
 import json
+import logging
+import hashlib
+import heapq
+import ahocorasick
 from dotenv import load_dotenv
-from telegram import Update, ChatPermissions, ParseMode
-from telegram.ext import Updater, MessageHandler, Filters, CallbackContext, CommandHandler, JobQueue
-from collections import defaultdict, deque
-from datetime import datetime, timedelta, timezone, time
+from telegram import Update, ChatPermissions
+from telegram.constants import ParseMode
+from telegram.ext import Application, MessageHandler, filters, CallbackContext, CommandHandler
+from collections import Counter, OrderedDict, deque
+from datetime import timedelta, time
+from time import monotonic
 from combot.scheduled_warnings import messages
 from combot.brand_assets import messages as brand_assets_messages
 
 load_dotenv()  # Load .env vars
 
+logger = logging.getLogger(__name__)
+
 # Get bot token from environment
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 GROUP_CHAT_ID = os.getenv('GROUP_CHAT_ID')
 
+# Log level (DEBUG shows per-message spam tracking)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Webhook settings - falls back to long polling when WEBHOOK_URL is unset
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+PORT = int(os.getenv('PORT', '8443'))
+
 # File path for filters
 FILTERS_FILE = "filters/filters.json"
 
@@ -29,33 +47,42 @@ WHITELIST_PHRASES = "whitelists/whitelist_phrases.txt"
 
 # Suspicious names to auto-ban
 SUSPICIOUS_USERNAMES = [
-    "dev", "developer", "admin", "mod", "owner", "arc", "arc_agent", "arc agent" "arch_agent", "arch agent", "support", "helpdesk", "administrator", "arc admin", "arc_admin"
+    "dev", "developer", "admin", "mod", "owner", "arc", "arc_agent", "arc agent", "arch_agent", "arch agent", "support", "helpdesk", "administrator", "arc admin", "arc_admin"
 ]
 
 # Mute duration in seconds (3 days)
 MUTE_DURATION = 3 * 24 * 60 * 60
 
+# Only the first MAX_SCAN_LENGTH characters of a message are moderated, capping work per message
+MAX_SCAN_LENGTH = 512
+
 # auto spam detection variables
 SPAM_THRESHOLD = 3
-TIME_WINDOW = timedelta(seconds=15)
-SPAM_TRACKER = defaultdict(lambda: deque(maxlen=SPAM_THRESHOLD))
-SPAM_RECORDS = {} # stores flagged spam messages for 5 minutes
-SPAM_RECORD_DURATION = timedelta(minutes=5)
+TIME_WINDOW = 15 # seconds, timestamps come from time.monotonic()
+SPAM_TRACKER_MAX_SIZE = 10_000
+SPAM_TRACKER = OrderedDict() # message key -> (deque of (user_id, timestamp), Counter of user_ids), least recently seen first
+SPAM_RECORDS = {} # stores flagged spam message keys for 5 minutes
+SPAM_RECORD_HEAP = [] # min-heap of (expires_at, message key) for SPAM_RECORDS
+SPAM_RECORD_DURATION = 5 * 60 # seconds
+
+# chat admins are cached per chat for ADMIN_CACHE_TTL seconds
+ADMIN_CACHE_TTL = 60
+ADMIN_CACHE = {} # chat_id -> (fetched_at, task resolving to the set of admin user_ids)
 
 # combot security message index
 message_index = 0
 
 # combot security message
-def post_security_message(context: CallbackContext):
+async def post_security_message(context: CallbackContext):
     global message_index
     message = messages[message_index]
-    sent_message = context.bot.send_message(
+    sent_message = await context.bot.send_message(
         chat_id=GROUP_CHAT_ID, 
         text=message, 
         parse_mode=ParseMode.HTML
     )
     # Pin the sent message
-    context.bot.pin_chat_message(
+    await context.bot.pin_chat_message(
         chat_id=GROUP_CHAT_ID, 
         message_id=sent_message.message_id, 
         disable_notification=True  # No loud ping
@@ -63,15 +90,15 @@ def post_security_message(context: CallbackContext):
     message_index = (message_index + 1) % len(messages)
 
 # combot brand assets
-def post_brand_assets(context: CallbackContext):
+async def post_brand_assets(context: CallbackContext):
     for message in brand_assets_messages:
-        sent_message = context.bot.send_message(
+        sent_message = await context.bot.send_message(
             chat_id=GROUP_CHAT_ID, 
             text=message, 
             parse_mode=ParseMode.HTML
         )
         # Pin the sent message
-        context.bot.pin_chat_message(
+        await context.bot.pin_chat_message(
             chat_id=GROUP_CHAT_ID, 
             message_id=sent_message.message_id, 
             disable_notification=True
@@ -84,6 +111,21 @@ def load_filters(file_path):
 
 FILTERS = load_filters(FILTERS_FILE)
 
+# Read filter media into memory once so responses don't touch the disk
+def load_media(filters):
+    media_cache = {}
+    for filter_data in filters.values():
+        media_file = filter_data.get("media")
+        if media_file and media_file not in media_cache:
+            media_path = os.path.join(MEDIA_FOLDER, media_file)
+            if os.path.exists(media_path):
+                with open(media_path, 'rb') as media:
+                    media_cache[media_file] = media.read()
+    return media_cache
+
+MEDIA_CACHE = load_media(FILTERS)
+MEDIA_FILE_IDS = {} # media file -> Telegram file_id, filled after the first upload
+
 # Load blocklist/whitelisted words/phrases from files
 def load_phrases(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
@@ -92,217 +134,374 @@ def load_phrases(file_path):
 BAN_PHRASES = load_phrases(BAN_PHRASES_FILE)
 MUTE_PHRASES = load_phrases(MUTE_PHRASES_FILE)
 DELETE_PHRASES = load_phrases(DELETE_PHRASES)
-WHITELIST_PHRASES = load_phrases(WHITELIST_PHRASES)
+WHITELIST_PHRASES = frozenset(load_phrases(WHITELIST_PHRASES))
+
+# One substring search over a name instead of testing each keyword in turn
+SUSPICIOUS_USERNAMES_RE = re.compile('|'.join(re.escape(keyword) for keyword in SUSPICIOUS_USERNAMES))
+
+# Phrase actions, strongest first - a message hitting several lists gets the strongest action
+PHRASE_ACTIONS = ("ban", "mute", "delete")
+
+# Build one Aho-Corasick automaton over every blocklist, tagging each phrase with its action
+def build_classifier(phrase_lists):
+    automaton = ahocorasick.Automaton()
+    for priority, (action, phrases) in enumerate(phrase_lists):
+        for phrase in phrases:
+            # a phrase listed twice keeps the strongest action
+            if phrase and phrase not in automaton:
+                automaton.add_word(phrase, (priority, action, phrase))
+    if not len(automaton):
+        return None  # an empty automaton can't be searched
+    automaton.make_automaton()
+    return automaton
+
+CLASSIFIER_AC = build_classifier(zip(PHRASE_ACTIONS, (BAN_PHRASES, MUTE_PHRASES, DELETE_PHRASES)))
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+# Same semantics as regex \b at index i of text
+def is_word_boundary(text, i):
+    before = i > 0 and is_word_char(text[i - 1])
+    after = i < len(text) and is_word_char(text[i])
+    return before != after
+
+# Cut text to MAX_SCAN_LENGTH without splitting a word - a cut word would look like a whole
+# word to the boundary checks ("airdroppers" cut to "airdropp")
+def scan_prefix(text):
+    # Leading whitespace is dropped first so padding can't push the text out of the scanned prefix
+    text = text.lstrip()
+    cut = MAX_SCAN_LENGTH
+    if len(text) > cut and is_word_char(text[cut]):
+        while cut > 0 and is_word_char(text[cut - 1]):
+            cut -= 1
+        if cut == 0:
+            # the prefix is one word, so no phrase in it can end on a fake boundary
+            cut = MAX_SCAN_LENGTH
+    return text[:cut].lower()
+
+# Scan text once and return (action, phrase) for the strongest phrase found with
+# word boundaries on both ends, or None
+def classify_phrases(text):
+    if CLASSIFIER_AC is None:
+        return None
+    best = None
+    for end, (priority, action, phrase) in CLASSIFIER_AC.iter(text):
+        if best and best[0] <= priority:
+            continue
+        start = end - len(phrase) + 1
+        if is_word_boundary(text, start) and is_word_boundary(text, end + 1):
+            best = (priority, action, phrase)
+            if priority == 0:
+                break  # nothing beats a ban
+    return best and best[1:]
+
+# Normalize each trigger once; a trigger that normalizes to an earlier one could never match
+def build_filter_items(filters):
+    normalized_triggers = {}
+    for trigger in filters:
+        normalized_triggers.setdefault(trigger.strip().lower(), trigger)
+    # (group name, trigger, normalized trigger, filter data)
+    return [
+        (f"f{i}", trigger, normalized_trigger, filters[trigger])
+        for i, (normalized_trigger, trigger) in enumerate(normalized_triggers.items())
+    ]
+
+FILTER_ITEMS = build_filter_items(FILTERS)
+
+# use word boundaries but allow underscores to be appended
+def filter_pattern(normalized_trigger):
+    return rf'(?<!\w)/?{re.escape(normalized_trigger)}(?:_\w+)?(?!\w)'
+
+# One named group per trigger so the match maps back to its FILTERS entry
+FILTER_TRIGGERS = {name: trigger for name, trigger, _, _ in FILTER_ITEMS}
+FILTER_DISPATCH = {name: filter_data for name, _, _, filter_data in FILTER_ITEMS}
+FILTER_UNION = re.compile('|'.join(
+    f'(?P<{name}>{filter_pattern(normalized_trigger)})' for name, _, normalized_trigger, _ in FILTER_ITEMS
+)) if FILTER_ITEMS else None  # an empty alternation would match every message
+
+# /filters output, built once from the loaded FILTERS so it matches what the bot responds to
+def build_filter_list(filters):
+    # Get and sort all triggers alphabetically (removing leading slash only for sorting)
+    sorted_triggers = sorted(filters.keys(), key=lambda k: k.lstrip('/').lower())
+
+    # Re-apply slash only if the original trigger had it
+    formatted_triggers = [f"`{trigger}`" for trigger in sorted_triggers]
+
+    # Telegram messages max out at 4096 characters
+    response = "*Available Filters:*\n" + "\n".join(formatted_triggers)
+    if len(response) > 4000:
+        return [
+            "*Available Filters:*\n" + "\n".join(formatted_triggers[i:i+80])
+            for i in range(0, len(formatted_triggers), 80)  # 80 items per message chunk
+        ]
+    return [response]
+
+FILTER_LIST_MESSAGES = build_filter_list(FILTERS)
+
+# Match a digit next to an 'x', possibly separated by spaces. Equivalent to the
+# old (?:\d\s*)+x|x\s*(?:\d\s*)+ without the nested quantifier that backtracks on long inputs
+MULT_PATTERN = re.compile(r"\d\s*x|x\s*\d", re.IGNORECASE)
 
 def contains_multiplication_phrase(text):
-    text = text.lower()
-    # Match digit(s) possibly separated by spaces, next to an 'x'
-    pattern = r"(?:\d\s*)+x|x\s*(?:\d\s*)+"
-    return re.search(pattern, text)
+    return MULT_PATTERN.search(text)
+
+# fixed-size fingerprint of a message, used as the SPAM_TRACKER/SPAM_RECORDS key
+def msg_key(message_text):
+    return hashlib.blake2b(message_text.encode('utf-8'), digest_size=16).digest()
 
 # check for spam
-def check_for_spam(message_text, user_id):
-    now = datetime.now(timezone.utc)
+def check_for_spam(message_key, user_id, now):
     # track user and timestamp of the message
-    print(f"Checking for spam: {message_text} from user: {user_id}")
-    SPAM_TRACKER[message_text].append((user_id, now))
+    if logger.isEnabledFor(logging.DEBUG):  # skip building the hex key when debug is off
+        logger.debug("Checking for spam: %s from user: %s", message_key.hex(), user_id)
+    entry = SPAM_TRACKER.get(message_key)
+    if entry is None:
+        entry = SPAM_TRACKER[message_key] = (deque(), Counter())
+        if len(SPAM_TRACKER) > SPAM_TRACKER_MAX_SIZE:
+            SPAM_TRACKER.popitem(last=False) # evict the least recently seen message
+    else:
+        SPAM_TRACKER.move_to_end(message_key)
+    recent, senders = entry
 
-    # Filter out old messages that are outside of the time window
-    recent = [entry for entry in SPAM_TRACKER[message_text] if now - entry[1] <= TIME_WINDOW]
-    SPAM_TRACKER[message_text] = deque(recent)
+    # Drop old messages that are outside of the time window, keeping the per-user counts in step
+    while recent and now - recent[0][1] > TIME_WINDOW:
+        expired_user_id, _ = recent.popleft()
+        senders[expired_user_id] -= 1
+        if not senders[expired_user_id]:
+            del senders[expired_user_id]
+    recent.append((user_id, now))
+    senders[user_id] += 1
 
-    print(f"Recent messages for '{message_text}': {recent}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Recent messages for '%s': %s", message_key.hex(), recent)
 
     # If recent messages exceed the threshold, flag as spam
     if len(recent) >= SPAM_THRESHOLD:
-        print(f"Spam detected for message: '{message_text}'")
+        logger.info("Spam detected for message: '%s'", message_key.hex())
         # flag message as spam and store for 5 minutes in memory
-        SPAM_RECORDS[message_text] = now # only store message and timestamp
-        spammer_ids = list(set([entry[0] for entry in recent])) # Return list of user_ids to mute
-        print(f"Flagging {len(spammer_ids)} users for spam: {spammer_ids}") 
+        SPAM_RECORDS[message_key] = now # only store message key and timestamp
+        heapq.heappush(SPAM_RECORD_HEAP, (now + SPAM_RECORD_DURATION, message_key))
+        spammer_ids = list(senders) # Return list of unique user_ids to mute
+        logger.info("Flagging %d users for spam: %s", len(spammer_ids), spammer_ids)
         return spammer_ids
-    
-    elif recent and len(recent) < SPAM_THRESHOLD and (now - recent[0][1] > TIME_WINDOW):
-        # Not spam, expired window – clean it up
-        SPAM_TRACKER.pop(message_text, None)
 
     return []
 
 # check for recent spam and mute spammers
-def check_recent_spam(message_text):
-    now = datetime.now(timezone.utc)
-    timestamp = SPAM_RECORDS.get(message_text)
+def check_recent_spam(message_key, now):
+    timestamp = SPAM_RECORDS.get(message_key)
     if timestamp:
-        print(f"Message '{message_text}' is flagged as spam, timestamp: {timestamp}")
-    return timestamp and (now - timestamp <= SPAM_RECORD_DURATION)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Message '%s' is flagged as spam, timestamp: %s", message_key.hex(), timestamp)
+    return timestamp is not None and now - timestamp <= SPAM_RECORD_DURATION
 
 # clean up spam records
-def cleanup_spam_records(context: CallbackContext):
-    now = datetime.now(timezone.utc)
+async def cleanup_spam_records(context: CallbackContext):
+    now = monotonic()
     expired_messages = []
 
-    for message_text, timestamp in list(SPAM_RECORDS.items()):
-        if now - timestamp > SPAM_RECORD_DURATION:
-            expired_messages.append(message_text)
-            del SPAM_RECORDS[message_text]
-            print(f"[CLEANUP] Removed expired spam record: '{message_text}'")
+    # Only pop records whose expiry is due; re-flagged messages have a newer timestamp and are kept
+    while SPAM_RECORD_HEAP and SPAM_RECORD_HEAP[0][0] <= now:
+        _, message_key = heapq.heappop(SPAM_RECORD_HEAP)
+        timestamp = SPAM_RECORDS.get(message_key)
+        if timestamp and now - timestamp >= SPAM_RECORD_DURATION:
+            expired_messages.append(message_key)
+            del SPAM_RECORDS[message_key]
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[CLEANUP] Removed expired spam record: '%s'", message_key.hex())
+
+    # SPAM_TRACKER is ordered by last message, so stale windows are all at the front
+    while SPAM_TRACKER:
+        recent, _ = next(iter(SPAM_TRACKER.values()))
+        if now - recent[-1][1] <= TIME_WINDOW:
+            break
+        SPAM_TRACKER.popitem(last=False)
 
     if not expired_messages:
-        print("[CLEANUP] No expired spam messages to remove.")
+        logger.debug("[CLEANUP] No expired spam messages to remove.")
+
 
+# mute a spammer until until_date
+async def mute_spammer(bot, chat_id, spammer_id, until_date):
+    permissions = ChatPermissions(can_send_messages=False)
+    await bot.restrict_chat_member(chat_id=chat_id, user_id=spammer_id, permissions=permissions, until_date=until_date)
+    logger.info("Muted user %s for spam message.", spammer_id)
 
-def check_message(update: Update, context: CallbackContext):
+async def fetch_admin_ids(bot, chat_id):
+    return {admin.user.id for admin in await bot.get_chat_administrators(chat_id)}
+
+# get admin user_ids for a chat, only hitting the Telegram API once per TTL window
+async def get_admin_ids(bot, chat_id, ttl=ADMIN_CACHE_TTL):
+    now = monotonic()
+    cached = ADMIN_CACHE.get(chat_id)
+    if cached and now - cached[0] < ttl:
+        fetch = cached[1]
+    else:
+        # Cache the in-flight fetch so concurrent misses share one API call
+        fetch = asyncio.ensure_future(fetch_admin_ids(bot, chat_id))
+        ADMIN_CACHE[chat_id] = (now, fetch)
+    try:
+        # shield so one cancelled handler doesn't cancel the fetch for everyone waiting on it
+        return await asyncio.shield(fetch)
+    except Exception:
+        # Don't keep a failed fetch cached for the whole TTL
+        if ADMIN_CACHE.get(chat_id, (None, None))[1] is fetch:
+            del ADMIN_CACHE[chat_id]
+        raise
+
+async def check_message(update: Update, context: CallbackContext):
     should_skip_spam_check = False
     
     message = update.message or update.channel_post  # Handle both messages and channel posts
+    if not message or not message.text:
+        return  # Skip non-text or unsupported messages
+
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
     user = update.effective_user
-    message_text = message.text.lower()
 
     # Fetch chat admins to prevent acting on their messages
-    chat_admins = context.bot.get_chat_administrators(chat_id)
-    admin_ids = [admin.user.id for admin in chat_admins]
+    admin_ids = await get_admin_ids(context.bot, chat_id)
+    # Read the clock after the await so spam timestamps stay in arrival order across concurrent updates
+    now = monotonic()
+    # Phrase and regex checks only look at the start of the message
+    message_text = scan_prefix(message.text)
+
+    # Match filters once - the result both skips the spam check and picks the response
+    filter_match = FILTER_UNION.search(message_text) if FILTER_UNION else None
 
-    if not message or not message.text:
-        return  # Skip non-text or unsupported messages
-    
     # Ignore messages from admins
     if user_id not in admin_ids:
+        # Length and whitelist compare the whole message, not the scanned prefix
+        stripped_text = message.text.strip()
 
         # check if message is too short
-        if len(message_text.strip()) < 2:
-            context.bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+        if len(stripped_text) < 2:
+            await context.bot.delete_message(chat_id=chat_id, message_id=message.message_id)
             return
 
         # Auto-ban based on suspicious name or username
-        name_username = f"{user.full_name} {user.username or ''}".lower()
-        if any(keyword in name_username for keyword in SUSPICIOUS_USERNAMES):
-            context.bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
+        if SUSPICIOUS_USERNAMES_RE.search(user.full_name.lower()) or (
+            user.username and SUSPICIOUS_USERNAMES_RE.search(user.username.lower())
+        ):
+            await context.bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
             return
 
         # Check for multiplication spam
         if contains_multiplication_phrase(message_text):
-            context.bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+            await context.bot.delete_message(chat_id=chat_id, message_id=message.message_id)
             return
         
         # 1. autospam - check if its a command or matches a filter
-        for trigger in FILTERS.keys():
-            normalized_trigger = trigger.strip().lower()
-            pattern = rf'(?<!\w)/?{re.escape(normalized_trigger)}(_\w+)?(?!\w)'
-            if re.search(pattern, message_text):
-                should_skip_spam_check = True
-                print(f"[SPAM CHECK SKIPPED] Message '{message_text}' matched FILTER trigger: '{trigger}'")
-                break
+        if filter_match:
+            should_skip_spam_check = True
+            logger.debug("[SPAM CHECK SKIPPED] Message '%s' matched FILTER trigger: '%s'", message_text, FILTER_TRIGGERS[filter_match.lastgroup])
 
         # 2. autospam - check whitelist
         if not should_skip_spam_check:
-            if message_text.strip() in WHITELIST_PHRASES:
-                print(f"[SPAM CHECK SKIPPED] Message '{message_text}' matched WHITELIST.")
+            if stripped_text.lower() in WHITELIST_PHRASES:
+                logger.debug("[SPAM CHECK SKIPPED] Message '%s' matched WHITELIST.", message_text)
                 should_skip_spam_check = True
 
         # 3. autospam - check for spam
         if not should_skip_spam_check:
             # Run spam detection only if no FILTER trigger matched
-            spammer_ids = check_for_spam(message_text, user_id)
+            # Fingerprint the whole message so long messages sharing a prefix aren't counted as one
+            message_key = msg_key(message.text.lower())
+            spammer_ids = check_for_spam(message_key, user_id, now)
 
-            if check_recent_spam(message_text) and user_id not in spammer_ids:
+            if check_recent_spam(message_key, now) and user_id not in spammer_ids:
                 spammer_ids.append(user_id)
 
             if spammer_ids:
-                print(f"Muting spammers for message: '{message_text}'")
-                for spammer_id in set(spammer_ids):
+                logger.info("Muting spammers for message: '%s'", message_text)
+                until_date = message.date + timedelta(seconds=MUTE_DURATION)
+                results = await asyncio.gather(
+                    *(mute_spammer(context.bot, chat_id, spammer_id, until_date) for spammer_id in spammer_ids),
+                    return_exceptions=True
+                )
+
+                muted_ids = []
+                for spammer_id, result in zip(spammer_ids, results):
+                    if isinstance(result, Exception):
+                        logger.warning("Failed to mute spammer %s: %s", spammer_id, result)
+                    else:
+                        muted_ids.append(str(spammer_id))
+
+                # One announcement for everyone muted by this message
+                if muted_ids:
+                    if len(muted_ids) == 1:
+                        announcement = f"User {muted_ids[0]} has been muted for 3 days."
+                    else:
+                        announcement = f"Users {', '.join(muted_ids)} have been muted for 3 days."
                     try:
-                        until_date = message.date + timedelta(seconds=MUTE_DURATION)
-                        permissions = ChatPermissions(can_send_messages=False)
-                        context.bot.restrict_chat_member(chat_id=chat_id, user_id=spammer_id, permissions=permissions, until_date=until_date)
-                        context.bot.send_message(chat_id=chat_id, text=f"User {spammer_id} has been muted for 3 days.")
-                        print(f"Muted user {spammer_id} for spam message.")
+                        await context.bot.send_message(chat_id=chat_id, text=announcement)
                     except Exception as e:
-                        print(f"Failed to mute spammer {spammer_id}: {e}")
+                        logger.warning("Failed to announce muted spammers %s: %s", muted_ids, e)
                 return
     
-        # Check for banned phrases
-        for phrase in BAN_PHRASES:
-            # Use word boundaries to match exact words
-            if re.search(r'\b' + re.escape(phrase) + r'\b', message_text):
-                print(f"[BAN MATCH] Phrase: '{phrase}' matched in message: '{message_text}'")
-                context.bot.ban_chat_member(chat_id=chat_id, user_id=user.id)
-                message.reply_text(f"arc angel fallen. {user.first_name} has been banned.")
-                return
-
-        # Check for muted phrases
-        for phrase in MUTE_PHRASES:
-            # Use word boundaries to match exact words
-            if re.search(r'\b' + re.escape(phrase) + r'\b', message_text):
-                print(f"[MUTE MATCH] Phrase: '{phrase}' matched in message: '{message_text}'")
+        # Check for banned, muted and deleted phrases in a single pass
+        phrase_match = classify_phrases(message_text)
+        if phrase_match:
+            action, phrase = phrase_match
+            logger.info("[%s MATCH] Phrase: '%s' matched in message: '%s'", action.upper(), phrase, message_text)
+            if action == "ban":
+                await context.bot.ban_chat_member(chat_id=chat_id, user_id=user.id)
+                await message.reply_text(f"arc angel fallen. {user.first_name} has been banned.")
+            elif action == "mute":
                 until_date = message.date + timedelta(seconds=MUTE_DURATION)
                 permissions = ChatPermissions(can_send_messages=False)
-                context.bot.restrict_chat_member(chat_id=chat_id, user_id=user.id, permissions=permissions, until_date=until_date)
-                message.reply_text(f"{user.first_name} has been muted for 3 days.")
-                return
-
-        # Check for deleted phrases
-        for phrase in DELETE_PHRASES:
-            # Use word boundaries to match exact words
-            if re.search(r'\b' + re.escape(phrase) + r'\b', message_text):
-                print(f"[DELETE MATCH] Phrase: '{phrase}' matched in message: '{message_text}'")
-                context.bot.delete_message(chat_id=chat_id, message_id=message.message_id)
-                return
+                await context.bot.restrict_chat_member(chat_id=chat_id, user_id=user.id, permissions=permissions, until_date=until_date)
+                await message.reply_text(f"{user.first_name} has been muted for 3 days.")
+            else:
+                await context.bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+            return
 
     # Filter Responses (apply to all)
-    for trigger, filter_data in FILTERS.items():
-        normalized_trigger = trigger.strip().lower()
-        # use word boundaries but allow underscores to be appended
-        pattern = rf'(?<!\w)/?{re.escape(normalized_trigger)}(_\w+)?(?!\w)'
-        
-        if re.search(pattern, message_text):
-            response_text = filter_data.get("response_text", "")
-            media_file = filter_data.get("media")
-            media_type = filter_data.get("type", "gif").lower()
-
-            if media_file:
-                media_path = os.path.join(MEDIA_FOLDER, media_file)
-                if os.path.exists(media_path):
-                    with open(media_path, 'rb') as media:
-                        if media_type in ["gif", "animation"]:
-                            context.bot.send_animation(chat_id=chat_id, animation=media, caption=response_text or None)
-                        elif media_type == "image":
-                            context.bot.send_photo(chat_id=chat_id, photo=media, caption=response_text or None)
-                        elif media_type == "video":
-                            context.bot.send_video(chat_id=chat_id, video=media, caption=response_text or None)
-                elif response_text:
-                    message.reply_text(response_text)
+    if filter_match:
+        filter_data = FILTER_DISPATCH[filter_match.lastgroup]
+        response_text = filter_data.get("response_text", "")
+        media_file = filter_data.get("media")
+        media_type = filter_data.get("type", "gif").lower()
+
+        if media_file:
+            # Reuse the file_id from a previous upload, otherwise upload the cached bytes
+            media = MEDIA_FILE_IDS.get(media_file) or MEDIA_CACHE.get(media_file)
+            if media is not None:
+                sent_media = None
+                if media_type in ["gif", "animation"]:
+                    sent_message = await context.bot.send_animation(chat_id=chat_id, animation=media, filename=media_file, caption=response_text or None)
+                    sent_media = sent_message.animation
+                elif media_type == "image":
+                    sent_message = await context.bot.send_photo(chat_id=chat_id, photo=media, filename=media_file, caption=response_text or None)
+                    sent_media = sent_message.photo[-1] if sent_message.photo else None
+                elif media_type == "video":
+                    sent_message = await context.bot.send_video(chat_id=chat_id, video=media, filename=media_file, caption=response_text or None)
+                    sent_media = sent_message.video
+                if sent_media:
+                    MEDIA_FILE_IDS[media_file] = sent_media.file_id
+                    # The file_id is used from now on, so the preloaded bytes can be freed
+                    MEDIA_CACHE.pop(media_file, None)
             elif response_text:
-                message.reply_text(response_text)
-            return  # Respond only once
+                await message.reply_text(response_text)
+        elif response_text:
+            await message.reply_text(response_text)
 
-def list_filters(update: Update, context: CallbackContext):
-    # Load the latest filters
-    with open(FILTERS_FILE, 'r', encoding='utf-8') as f:
-        filters = json.load(f)
-
-    # Get and sort all triggers alphabetically (removing leading slash only for sorting)
-    sorted_triggers = sorted(filters.keys(), key=lambda k: k.lstrip('/').lower())
-
-    # Re-apply slash only if the original trigger had it
-    formatted_triggers = [f"`{trigger}`" for trigger in sorted_triggers]
-
-    # Telegram messages max out at 4096 characters
-    response = "*Available Filters:*\n" + "\n".join(formatted_triggers)
-    if len(response) > 4000:
-        for i in range(0, len(formatted_triggers), 80):  # 80 items per message chunk
-            chunk = "*Available Filters:*\n" + "\n".join(formatted_triggers[i:i+80])
-            update.message.reply_text(chunk, parse_mode="Markdown")
-    else:
-        update.message.reply_text(response, parse_mode="Markdown")
+async def list_filters(update: Update, context: CallbackContext):
+    for response in FILTER_LIST_MESSAGES:
+        await update.message.reply_text(response, parse_mode="Markdown")
 
 def main():
-    updater = Updater(BOT_TOKEN, use_context=True)
-    dp = updater.dispatcher
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s", level=LOG_LEVEL)
+    # httpx logs every Bot API request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # Handle updates concurrently so one slow API call doesn't hold up other messages
+    application = Application.builder().token(BOT_TOKEN).concurrent_updates(True).build()
 
-    # Get the JobQueue from the dispatcher
-    job_queue = updater.job_queue
+    # Get the JobQueue from the application
+    job_queue = application.job_queue
 
     # Post security message every 4 hours
     job_queue.run_repeating(post_security_message, interval=4 * 60 * 60, first=0)
@@ -315,13 +514,21 @@ def main():
     job_queue.run_repeating(cleanup_spam_records, interval=60, first=60)
 
     # output filters
-    dp.add_handler(CommandHandler("filters", list_filters))
+    application.add_handler(CommandHandler("filters", list_filters))
 
     # Add text and command message handler
-    dp.add_handler(MessageHandler(Filters.text | Filters.command, check_message))
-
-    updater.start_polling()
-    updater.idle()
+    application.add_handler(MessageHandler(filters.TEXT | filters.COMMAND, check_message))
+
+    if WEBHOOK_URL:
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET
+        )
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# bot.py loads its filters and phrase lists relative to the repo root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
@@ -0,0 +1,40 @@
+import bot
+
+
+def filler(length):
+    # ends in a space so the next word starts exactly at `length`
+    return ("lorem " * length)[:length - 1] + " "
+
+
+def test_short_text_is_lowered_and_left_stripped():
+    assert bot.scan_prefix("   Hit Me Up ") == "hit me up "
+
+
+def test_phrase_straddling_cutoff_is_not_matched():
+    text = filler(bot.MAX_SCAN_LENGTH - len("airdropp")) + "airdroppers are great"
+    assert bot.classify_phrases(text.lower()) is None
+    assert bot.classify_phrases(bot.scan_prefix(text)) is None
+
+
+def test_delete_phrase_straddling_cutoff_is_not_matched():
+    text = filler(bot.MAX_SCAN_LENGTH - len("scam")) + "scammed"
+    assert bot.classify_phrases(bot.scan_prefix(text)) is None
+
+
+def test_filter_trigger_straddling_cutoff_is_not_matched():
+    text = filler(bot.MAX_SCAN_LENGTH - len("discord")) + "discordant"
+    assert not bot.FILTER_UNION.search(bot.scan_prefix(text))
+
+
+def test_phrase_before_cutoff_is_still_matched():
+    text = filler(bot.MAX_SCAN_LENGTH - 20) + " airdropp " + "x" * 100
+    assert bot.classify_phrases(bot.scan_prefix(text)) == ("ban", "airdropp")
+
+
+def test_single_long_word_keeps_full_prefix():
+    assert bot.scan_prefix("a" * 1000) == "a" * bot.MAX_SCAN_LENGTH
+
+
+def test_spam_key_covers_text_past_the_cutoff():
+    quote = "lorem " * 100
+    assert bot.msg_key(quote + "i agree") != bot.msg_key(quote + "i disagree")